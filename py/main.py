@@ -1,7 +1,7 @@
 #!/usr/bin/env python3
 
 from tausch import Tausch, TauschError
-import subprocess
+import bisect
 
 try:
     # provides extended input() method with
@@ -12,6 +12,7 @@ except:
 
 matches = []
 var = {"hello": 42, "world": 69, "cond": True, "ncond": False}
+sorted_names = sorted(var)
 
 
 def cmpl(text, state):
@@ -19,9 +20,11 @@ def cmpl(text, state):
 
     if state == 0:
         if text:
-            matches = [v for v in var if v and v.startswith(text)]
+            lo = bisect.bisect_left(sorted_names, text)
+            hi = bisect.bisect_left(sorted_names, text + "\U0010ffff")
+            matches = sorted_names[lo:hi]
         else:
-            matches = var[:]
+            matches = sorted_names[:]
 
     try:
         return matches[state]
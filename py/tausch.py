@@ -26,9 +26,11 @@ of the 'tausch' language.
 # SOFTWARE.
 
 
+import re
+from collections import OrderedDict
 from dataclasses import dataclass
-from enum import IntEnum, StrEnum
-from typing import Any
+from enum import IntEnum
+from typing import Any, Callable
 
 
 class TauschTokenType(IntEnum):
@@ -44,12 +46,12 @@ class TauschTokenType(IntEnum):
     IF_ELSE = 4
 
 
-@dataclass
+@dataclass(slots=True)
 class TauschToken:
     """
-    The tausch tokenizer emits an array of
-    TauschTokens. Every token has a type
-    and an optional value.
+    Every token has a type and an optional value.
+    The tausch tokenizer stores tokens as plain
+    (typ, value) tuples with the same layout.
     """
 
     typ: TauschTokenType
@@ -70,19 +72,29 @@ class TauschError(Exception):
         super().__init__(self.message)
 
 
-class TauschOpType(StrEnum):
+class TauschOpType(IntEnum):
     """
     This enum contains all operation types that
     tausch supports
     """
 
-    VARIABLE = "var"
-    IF_BLOCK = "if_block"
-    IF_CONDITION = "if_condition"
-    IF_BODY = "if_body"
+    VARIABLE = 0
+    IF_BLOCK = 1
+    IF_CONDITION = 2
+    IF_BODY = 3
+
+
+_OP_NAMES = {
+    TauschOpType.VARIABLE: "var",
+    TauschOpType.IF_BLOCK: "if_block",
+    TauschOpType.IF_CONDITION: "if_condition",
+    TauschOpType.IF_BODY: "if_body",
+}
+
+_MISSING = object()
 
 
-@dataclass
+@dataclass(slots=True)
 class TauschOp:
     """
     Every TauschOp contains a type and an optional
@@ -93,7 +105,7 @@ class TauschOp:
     value: Any = None
 
 
-@dataclass
+@dataclass(slots=True)
 class TauschTreeNode:
     """
     The tausch parser emits a tree of TauschTreeNodes.
@@ -110,36 +122,61 @@ class TauschTreeNode:
         Insert 'node' on the left side of this node
         """
 
-        if self.left:
-            self.left.insert_left(node)
-        else:
-            self.left = node
+        cur = self
+        while cur.left:
+            cur = cur.left
+        cur.left = node
 
     def insert_right(self, node):
         """
         Insert 'node' on the right side of this node
         """
 
-        if self.right:
-            self.right.insert_right(node)
-        else:
-            self.right = node
+        cur = self
+        while cur.right:
+            cur = cur.right
+        cur.right = node
 
     def to_ascii(self, off: str = "", pointer: str = ""):
         """
         Prints an ascii-version of the tree
         """
 
-        label = self.operation.typ if self.operation else "None"
-        if self.operation and self.operation.value:
-            label += f": '{self.operation.value}'"
-
-        print(f"{off}{pointer}{label}")
-        off += "|  "
-        if self.left:
-            self.left.to_ascii(off, "|- ")
-        if self.right:
-            self.right.to_ascii(off, "|- ")
+        lines = []
+        stack = [(self, off, pointer)]
+        while stack:
+            node, off, pointer = stack.pop()
+            label = _OP_NAMES[node.operation.typ] if node.operation else "None"
+            if node.operation and node.operation.value:
+                label += f": '{node.operation.value}'"
+
+            lines.append(f"{off}{pointer}{label}")
+            off += "|  "
+            if node.right:
+                stack.append((node.right, off, "|- "))
+            if node.left:
+                stack.append((node.left, off, "|- "))
+
+        print("\n".join(lines))
+
+    def _to_dot_emit(self, out: list) -> None:
+        stack = [(self, None)]
+        while stack:
+            node, parent = stack.pop()
+            if parent is not None:
+                out.append(f"  {id(parent)} -- {id(node)};\n")
+
+            label = "root"
+            if node.operation:
+                label = _OP_NAMES[node.operation.typ]
+                if node.operation.value:
+                    label += f"__{node.operation.value}"
+
+            out.append(f'  {id(node)} [label="{label}"];\n')
+            if node.right:
+                stack.append((node.right, node))
+            if node.left:
+                stack.append((node.left, node))
 
     def to_dot_recursive(self, dotcode: str) -> str:
         """
@@ -148,35 +185,19 @@ class TauschTreeNode:
         version.
         """
 
-        label = "root"
-        if self.operation:
-            label = self.operation.typ
-            if self.operation.value:
-                label += f"__{self.operation.value}"
-
-        dotcode += f'  {id(self.operation)} [label="{label}"];\n'
-        if self.left:
-            dotcode += (
-                f"  {id(self.operation)} -- {id(self.left.operation)};\n"
-            )
-            dotcode = self.left.to_dot_recursive(dotcode)
-        if self.right:
-            dotcode += (
-                f"  {id(self.operation)} -- {id(self.right.operation)};\n"
-            )
-            dotcode = self.right.to_dot_recursive(dotcode)
-
-        return dotcode
+        out = [dotcode]
+        self._to_dot_emit(out)
+        return "".join(out)
 
     def to_dot(self) -> str:
         """
         Print a DOT-version of the tree
         """
 
-        dotcode = "graph {\n"
-        dotcode = self.to_dot_recursive(dotcode)
-        dotcode += "}\n"
-        return dotcode
+        out = ["graph {\n"]
+        self._to_dot_emit(out)
+        out.append("}\n")
+        return "".join(out)
 
 
 class Tausch:
@@ -184,225 +205,231 @@ class Tausch:
     This class implements the tausch lang
     """
 
-    def __init__(self, variables: {}):
-        self.tokens = [TauschToken]
+    def __init__(self, variables: {}, cache_size: int = 128):
+        self.tokens: list[tuple] = []
         self.variables = variables
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._last_data: str = None
+        self._last_compiled: tuple = None
         self.type_names = {
             TauschTokenType.IF_START: "if",
             TauschTokenType.IF_END: ";",
             TauschTokenType.IF_ELSE: ":",
             TauschTokenType.IF_NEGATE: "!",
         }
+        patterns = [r"(?P<WS>\s+)"]
+        for typ, name in sorted(
+            self.type_names.items(), key=lambda item: -len(item[1])
+        ):
+            pattern = re.escape(name)
+            if re.match(r"\w", name[-1]):
+                pattern += r"(?!\w)"
+            patterns.append(f"(?P<{typ.name}>{pattern})")
+        patterns += [r"(?P<VARIABLE>\w+)", r"(?P<BAD>.)"]
+        self._scanner = re.compile("|".join(patterns), re.DOTALL)
+        self._token_types = [None] * (self._scanner.groups + 1)
+        for typ in TauschTokenType:
+            self._token_types[self._scanner.groupindex[typ.name]] = typ
+        self._parse_handlers = {
+            TauschTokenType.VARIABLE: self._parse_variable,
+            TauschTokenType.IF_START: self._parse_if,
+        }
         self.data = ""
 
-    def _is_allowed_varname(self, char: str) -> bool:
-        return char.isalnum() or char == "_" if len(char) == 1 else False
+    def _tokenize(self) -> None:
+        tokens = []
+        append = tokens.append
+        token_types = self._token_types
+        variable = TauschTokenType.VARIABLE
+
+        for m in self._scanner.finditer(self.data):
+            typ = token_types[m.lastindex]
+            if typ is variable:
+                append((typ, m.group()))
+            elif typ is not None:
+                append((typ, None))
+            elif m.lastgroup == "BAD":
+                raise TauschError(f"Unknown token: '{m.group()}'", m.start())
+
+        self.tokens = tokens
 
-    def _is_allowed_token(self, char: str) -> bool:
-        return (
-            self._is_allowed_varname(char)
-            or (char in self.type_names.values())
-            if len(char) == 1
-            else False
-        )
+    def _expect_token(self, i: int, typ: TauschTokenType) -> bool:
+        return i < len(self.tokens) and self.tokens[i][0] is typ
 
-    def _tokenize(self) -> None:
-        self.tokens = []
+    def _parse_variable(
+        self, i: int, left_tail: TauschTreeNode, right_tail: TauschTreeNode
+    ) -> tuple[int, TauschTreeNode, TauschTreeNode]:
+        node_var = TauschTreeNode(
+            TauschOp(TauschOpType.VARIABLE, self.tokens[i][1])
+        )
+        left_tail.left = node_var
+        return (i + 1, node_var, right_tail)
+
+    def _parse_if(
+        self, i: int, left_tail: TauschTreeNode, right_tail: TauschTreeNode
+    ) -> tuple[int, TauschTreeNode, TauschTreeNode]:
+        tokens = self.tokens
+        expect = self._expect_token
+
+        node_if = TauschTreeNode(TauschOp(TauschOpType.IF_BLOCK))
+        if not expect(i + 1, TauschTokenType.VARIABLE):
+            raise TauschError("Variable name expected", i + 1)
+        i += 1
+        node_cond = TauschTreeNode(
+            TauschOp(TauschOpType.IF_CONDITION, tokens[i][1])
+        )
+        node_if.left = node_cond
 
-        i = 0
-        while i < len(self.data):
-            match self.data[i]:
-                case s if s.isspace():
-                    i += 1
-                case c if self._is_allowed_token(c):
-                    iadd = 1
-                    found = False
-                    for key, value in self.type_names.items():
-                        val_len = len(value)
-                        if (i + val_len) > len(self.data):
-                            continue
-                        if self.data[i : i + val_len] == value:
-                            self.tokens.append(TauschToken(key))
-                            iadd = val_len
-                            found = True
-                            break
-
-                    if found:
-                        i += iadd
-                        continue
-
-                    varname = ""
-                    while i < len(self.data) and self._is_allowed_varname(
-                        self.data[i]
-                    ):
-                        varname += self.data[i]
-                        i += 1
-                    self.tokens.append(
-                        TauschToken(TauschTokenType.VARIABLE, varname)
-                    )
-                case _:
-                    raise TauschError(f"Unknown token: '{self.data[i]}'", i)
+        if not expect(i + 1, TauschTokenType.IF_END):
+            raise TauschError(
+                "Unterminated 'if'",
+                i + 1,
+                f"{self.data}{self.type_names[TauschTokenType.IF_END]}",
+            )
+        i += 1
+
+        if not expect(i + 1, TauschTokenType.VARIABLE):
+            raise TauschError("'if'-body must contain variable", i + 1)
+        i += 1
+        node_body = TauschTreeNode(TauschOp(TauschOpType.IF_BODY))
+        node_body_true = TauschTreeNode(
+            TauschOp(TauschOpType.VARIABLE, tokens[i][1])
+        )
+        node_body.left = node_body_true
 
-    def _expect_token(self, i: int, typ: TauschTokenType) -> bool:
-        return i < len(self.tokens) and self.tokens[i].typ is typ
+        if expect(i + 1, TauschTokenType.IF_ELSE):
+            i += 1
+            if expect(i + 1, TauschTokenType.VARIABLE):
+                i += 1
+                node_body_false = TauschTreeNode(
+                    TauschOp(TauschOpType.VARIABLE, tokens[i][1])
+                )
+                node_body.right = node_body_false
+            else:
+                raise TauschError(
+                    f"Expected variable after '{self.type_names[TauschTokenType.IF_ELSE]}'",
+                    i,
+                )
+        node_if.right = node_body
+        right_tail.right = node_if
+        return (i + 1, left_tail, node_body.right or node_body)
 
     def _parse(self) -> TauschTreeNode:
+        tokens = self.tokens
+        n = len(tokens)
+        handlers = self._parse_handlers
+
         tree_root = TauschTreeNode(None)
+        left_tail = tree_root
+        right_tail = tree_root
         i = 0
-        while i < len(self.tokens):
-            tok = self.tokens[i]
-            match tok.typ:
-                case TauschTokenType.VARIABLE:
-                    tree_root.insert_left(
-                        TauschTreeNode(
-                            TauschOp(TauschOpType.VARIABLE, tok.value)
-                        )
-                    )
-                case TauschTokenType.IF_START:
-                    node_if = TauschTreeNode(TauschOp(TauschOpType.IF_BLOCK))
-                    if not self._expect_token(i + 1, TauschTokenType.VARIABLE):
-                        raise TauschError("Variable name expected", i + 1)
-                    i += 1
-                    node_cond = TauschTreeNode(
-                        TauschOp(
-                            TauschOpType.IF_CONDITION, self.tokens[i].value
-                        )
-                    )
-                    node_if.left = node_cond
-
-                    if not self._expect_token(i + 1, TauschTokenType.IF_END):
-                        raise TauschError(
-                            "Unterminated 'if'",
-                            i + 1,
-                            f"{self.data}{self.type_names[TauschTokenType.IF_END]}",
-                        )
-                    i += 1
-
-                    if not self._expect_token(i + 1, TauschTokenType.VARIABLE):
-                        raise TauschError(
-                            "'if'-body must contain variable", i + 1
-                        )
-                    i += 1
-                    node_body = TauschTreeNode(TauschOp(TauschOpType.IF_BODY))
-                    node_body_true = TauschTreeNode(
-                        TauschOp(TauschOpType.VARIABLE, self.tokens[i].value)
-                    )
-                    node_body.left = node_body_true
-
-                    if self._expect_token(i + 1, TauschTokenType.IF_ELSE):
-                        i += 1
-                        if self._expect_token(i + 1, TauschTokenType.VARIABLE):
-                            i += 1
-                            node_body_false = TauschTreeNode(
-                                TauschOp(
-                                    TauschOpType.VARIABLE, self.tokens[i].value
-                                )
-                            )
-                            node_body.right = node_body_false
-                        else:
-                            raise TauschError(
-                                f"Expected variable after '{self.type_names[TauschTokenType.IF_ELSE]}'",
-                                i,
-                            )
-                    node_if.right = node_body
-                    tree_root.insert_right(node_if)
-                case _:
-                    raise TauschError(
-                        f"Did not expect token of type {tok.typ}", i
-                    )
-            i += 1
+        while i < n:
+            typ = tokens[i][0]
+            handler = handlers.get(typ)
+            if handler is None:
+                raise TauschError(f"Did not expect token of type {typ}", i)
+            i, left_tail, right_tail = handler(i, left_tail, right_tail)
 
         return tree_root
 
-    def _check(self, obj: Any, msg: str):
-        if not obj:
-            raise TauschError(msg)
-        return True
+    def _is_op(self, node: TauschTreeNode, typ: TauschOpType) -> bool:
+        return (
+            node is not None
+            and node.operation is not None
+            and node.operation.typ is typ
+        )
 
-    def eval(self, data: str) -> (str, TauschTreeNode):
+    def _compile(self, tree_root: TauschTreeNode) -> Callable:
         """
-        Evaluate the tausch-code stored in 'data' and
-        return the result or an TauschError on failure
+        Validate the tree emitted by the parser once and
+        return a function that evaluates it against a
+        variables-dict
         """
 
-        self.data = data
-        self._tokenize()
-        tree_root = self._parse()
-
         if tree_root.left:
-            node_itr = tree_root.left
-            self._check(node_itr.operation, "No operation")
-            self._check(
-                node_itr.operation.typ is TauschOpType.VARIABLE, "Parse error"
-            )
-            self._check(
-                node_itr.operation.value in self.variables,
-                f"Variable '{node_itr.operation.value}' not found",
-            )
-            return (self.variables[node_itr.operation.value], tree_root)
+            node_var = tree_root.left
+            if not node_var.operation:
+                raise TauschError("No operation")
+            if not self._is_op(node_var, TauschOpType.VARIABLE):
+                raise TauschError("Parse error")
+            name = node_var.operation.value
 
-        if tree_root.right:
-            if_block = tree_root.right
-            self._check(if_block.operation, "Parse error")
-            self._check(
-                if_block.operation.typ is TauschOpType.IF_BLOCK, "Parse error"
-            )
-
-            if_condition = tree_root.right.left
-            self._check(if_condition, "Parse error")
-            self._check(if_condition.operation, "Parse error")
-            self._check(
-                if_condition.operation.typ is TauschOpType.IF_CONDITION,
-                "Parse error",
-            )
-            self._check(
-                if_condition.operation.value in self.variables,
-                f"Variable '{if_condition.operation.value}' not found",
-            )
-            self._check(
-                isinstance(self.variables[if_condition.operation.value], bool),
-                f"Variable '{if_condition.operation.value}' must be boolean",
-            )
-
-            if_body = tree_root.right.right
-            self._check(if_body, "Parse error")
-            self._check(if_body.operation, "Parse error")
-            self._check(
-                if_body.operation.typ is TauschOpType.IF_BODY, "Parse error"
-            )
+            def evaluate_variable(variables: dict) -> Any:
+                value = variables.get(name, _MISSING)
+                if value is _MISSING:
+                    raise TauschError(f"Variable '{name}' not found")
+                return value
 
-            if_body_left = tree_root.right.right.left
-            self._check(if_body_left, "Parse error")
-            self._check(if_body_left.operation, "Parse error")
-            self._check(
-                if_body_left.operation.typ is TauschOpType.VARIABLE,
-                "Parse error",
-            )
-            self._check(
-                if_body_left.operation.value in self.variables,
-                f"Variable '{if_body_left.operation.value}' not found",
-            )
+            return evaluate_variable
 
-            if self.variables[if_condition.operation.value]:
-                return (
-                    self.variables[if_body_left.operation.value],
-                    tree_root,
-                )
+        if tree_root.right:
+            if_block = tree_root.right
+            if_condition = if_block.left
+            if_body = if_block.right
+            if_body_left = if_body.left if if_body else None
+            if_body_right = if_body.right if if_body else None
+            if not (
+                self._is_op(if_block, TauschOpType.IF_BLOCK)
+                and self._is_op(if_condition, TauschOpType.IF_CONDITION)
+                and self._is_op(if_body, TauschOpType.IF_BODY)
+                and self._is_op(if_body_left, TauschOpType.VARIABLE)
+            ):
+                raise TauschError("Parse error")
+
+            cond = if_condition.operation.value
+            then = if_body_left.operation.value
+            other = None
+            if self._is_op(if_body_right, TauschOpType.VARIABLE):
+                other = if_body_right.operation.value
+            else_malformed = if_body_right is not None and other is None
+
+            def evaluate_if(variables: dict) -> Any:
+                cond_value = variables.get(cond, _MISSING)
+                if cond_value is _MISSING:
+                    raise TauschError(f"Variable '{cond}' not found")
+                if not isinstance(cond_value, bool):
+                    raise TauschError(f"Variable '{cond}' must be boolean")
+                then_value = variables.get(then, _MISSING)
+                if then_value is _MISSING:
+                    raise TauschError(f"Variable '{then}' not found")
+
+                if cond_value:
+                    return then_value
+
+                if else_malformed:
+                    raise TauschError("Parse error")
+                if other is None:
+                    return ""
+                other_value = variables.get(other, _MISSING)
+                if other_value is _MISSING:
+                    raise TauschError(f"Variable '{other}' not found")
+                return other_value
+
+            return evaluate_if
+
+        return lambda variables: ""
 
-            if_body_right = tree_root.right.right.right
-            if if_body_right:
-                self._check(if_body_right.operation, "Parse error")
-                self._check(
-                    if_body_right.operation.typ is TauschOpType.VARIABLE,
-                    "Parse error",
-                )
-                self._check(
-                    if_body_right.operation.value in self.variables,
-                    f"Variable '{if_body_right.operation.value}' not found",
-                )
-                return (
-                    self.variables[if_body_right.operation.value],
-                    tree_root,
-                )
+    def eval(self, data: str) -> (str, TauschTreeNode):
+        """
+        Evaluate the tausch-code stored in 'data' and
+        return the result or an TauschError on failure
+        """
 
-        return ("", tree_root)
+        self.data = data
+        if data == self._last_data:
+            compiled = self._last_compiled
+        elif compiled := self._cache.get(data):
+            self._cache.move_to_end(data)
+        else:
+            self._tokenize()
+            tree_root = self._parse()
+            compiled = (self._compile(tree_root), tree_root, self.tokens)
+            self._cache[data] = compiled
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+        self._last_data = data
+        self._last_compiled = compiled
+        evaluate, tree_root, self.tokens = compiled
+        return (evaluate(self.variables), tree_root)